@@ -1,10 +1,17 @@
 # dsc209_project1_checkpoint.py
-# Python 3.x — requires: pandas, numpy, matplotlib
+# Python 3.x — requires: pandas, numpy, pyarrow, matplotlib
 # Usage: python dsc209_project1_checkpoint.py
 
+import csv
 import pandas as pd
 import numpy as np
+import pyarrow as pa
+import pyarrow.csv as pac
+import matplotlib
+matplotlib.use("Agg")  # file output only: skip GUI backend initialization
 import matplotlib.pyplot as plt
+from matplotlib.ticker import FixedLocator, FuncFormatter, MultipleLocator
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 import sys
 
@@ -15,106 +22,155 @@ INPUT_CSV = "grocerydb.csv"  # put your CSV in the same folder
 OUT_PLOT1 = "plot1_sugar_vs_fiber_fpro.png"
 OUT_PLOT2 = "plot2_price_premium_by_category.png"
 OUT_PLOT3 = "plot3_store_by_fproclass_pricepercal.png"
+DPI = 110  # screen/web resolution; margins are fixed below, so no tight-bbox pass on save
+
+# Accepted spellings for the price-per-calorie and processing-class columns
+_price_cols = ["price percal", "price_percal", "price_per_cal", "price_per_kcal"]
+_possible_class_cols = ["FPro_class", "fpro_class", "processing_class"]
+
+
+def fast_numeric(s: pd.Series) -> pd.Series:
+    # The float32 columns arrive ready to use; only a text column (e.g. a class
+    # column with stray labels) takes the element-wise coerce path
+    if pd.api.types.is_numeric_dtype(s):
+        return s.astype(np.float32)
+    return pd.to_numeric(s, errors="coerce", downcast="float")
+
 
 # -----------------------------
 # LOAD
 # -----------------------------
-if not Path(INPUT_CSV).exists():
-    sys.exit(f"ERROR: Could not find {INPUT_CSV} next to this script.")
+def load_data() -> pd.DataFrame:
+    if not Path(INPUT_CSV).exists():
+        sys.exit(f"ERROR: Could not find {INPUT_CSV} next to this script.")
 
-df = pd.read_csv(INPUT_CSV)
+    # Only parse the columns the three plots use (Arrow reader, multi-threaded).
+    # Measures are parsed straight to float32: the plots need ~5 significant digits,
+    # and every mask/groupby below then moves half the bytes of float64.
+    with open(INPUT_CSV, newline="", encoding="utf-8") as fh:
+        _header = next(csv.reader(fh))
+    _float_cols = ["FPro", "Sugars, total", "Fiber, total dietary", *_price_cols]
+    _wanted = ["category", "store", *_float_cols, *_possible_class_cols]
+    tbl = pac.read_csv(
+        INPUT_CSV,
+        convert_options=pac.ConvertOptions(
+            column_types={c: pa.float32() for c in _float_cols},
+            include_columns=[c for c in _wanted if c in _header],
+        ),
+    )
+    df = tbl.to_pandas()  # NumPy-backed: float32 with NaN for missing
 
-# -----------------------------
-# ROBUST COLUMN NORMALIZATION
-# -----------------------------
-# 1) price_percal: accept multiple spellings
-_price_cols = ["price percal", "price_percal", "price_per_cal", "price_per_kcal"]
-_price_col = next((c for c in _price_cols if c in df.columns), None)
-if _price_col is None:
-    raise ValueError(f"Could not find a price-per-calorie column. Tried: {_price_cols}")
-df["price_percal"] = pd.to_numeric(df[_price_col], errors="coerce")
-
-# 2) FPro: must be continuous 0..1
-if "FPro" not in df.columns:
-    raise ValueError("Expected a continuous 'FPro' column (0–1).")
-df["FPro"] = pd.to_numeric(df["FPro"], errors="coerce")
-
-# 3) category / store as strings
-for col in ["category", "store"]:
-    if col in df.columns:
-        df[col] = df[col].astype(str)
+    # -----------------------------
+    # ROBUST COLUMN NORMALIZATION
+    # -----------------------------
+    # 1) price_percal: accept multiple spellings
+    _price_col = next((c for c in _price_cols if c in df.columns), None)
+    if _price_col is None:
+        raise ValueError(f"Could not find a price-per-calorie column. Tried: {_price_cols}")
+    df["price_percal"] = fast_numeric(df[_price_col])
+
+    # 2) FPro: must be continuous 0..1
+    if "FPro" not in df.columns:
+        raise ValueError("Expected a continuous 'FPro' column (0–1).")
+    df["FPro"] = fast_numeric(df["FPro"])
+
+    # 3) category / store as categoricals of strings (each label stored once)
+    for col in ["category", "store"]:
+        if col in df.columns:
+            df[col] = df[col].astype(str).astype("category")
+        else:
+            raise ValueError(f"Missing required column '{col}' in CSV.")
+
+    # 4) Create integer FPro class 0..3 (prefer existing, else bin)
+    _class_col = next((c for c in _possible_class_cols if c in df.columns), None)
+
+    if _class_col is not None:
+        df["FPro_class_int"] = fast_numeric(df[_class_col]).round().astype("Int64")
     else:
-        raise ValueError(f"Missing required column '{col}' in CSV.")
+        # Simple binning: adjust thresholds if your course specifies different ones
+        # 0: <=0.10, 1: (0.10, 0.40], 2: (0.40, 0.70], 3: (0.70, 1.00]
+        # searchsorted on the inner edges yields the class codes directly (side="left"
+        # keeps the bins right-closed); values outside (-0.001, 1.00] or NaN -> <NA>
+        edges = np.array([0.10, 0.40, 0.70], dtype=np.float32)
+        fp = df["FPro"].to_numpy()
+        codes = np.searchsorted(edges, fp, side="left").astype(np.int64)
+        df["FPro_class_int"] = pd.arrays.IntegerArray(codes, mask=~((fp > -0.001) & (fp <= 1.00)))
 
-# 4) Create integer FPro class 0..3 (prefer existing, else bin)
-_possible_class_cols = ["FPro_class", "fpro_class", "processing_class"]
-_class_col = next((c for c in _possible_class_cols if c in df.columns), None)
+    # Keep only what the plots read, so the copy sent to each plot worker stays small
+    return df[["category", "store", "FPro", "FPro_class_int", "price_percal",
+               "Sugars, total", "Fiber, total dietary"]]
 
-if _class_col is not None:
-    df["FPro_class_int"] = pd.to_numeric(df[_class_col], errors="coerce").round().astype("Int64")
-else:
-    # Simple binning: adjust thresholds if your course specifies different ones
-    # 0: <=0.10, 1: (0.10, 0.40], 2: (0.40, 0.70], 3: (0.70, 1.00]
-    bins = [-0.001, 0.10, 0.40, 0.70, 1.00]
-    df["FPro_class_int"] = pd.cut(df["FPro"], bins=bins, labels=[0, 1, 2, 3]).astype("Int64")
 
 # -----------------------------
 # PLOT 1 — Sugar vs Fiber colored by FPro
 # Focus on snacks*, cereal, drink* categories
 # -----------------------------
-cat_lower = df["category"].str.lower()
-mask_snacks = cat_lower.str.startswith("snacks-")
-mask_cereal = cat_lower.eq("cereal") | cat_lower.eq("breakfast") | cat_lower.str.contains("cereal")
-mask_drinks = cat_lower.str.startswith("drink-") | cat_lower.str.contains("soda")
-
-mask_plot1 = mask_snacks | mask_cereal | mask_drinks
-
-d1 = df.loc[
-    mask_plot1,
-    ["Sugars, total", "Fiber, total dietary", "FPro"]
-].dropna()
-
-plt.figure(figsize=(8.5, 6.8))
-sc = plt.scatter(
-    d1["Sugars, total"], d1["Fiber, total dietary"],
-    c=d1["FPro"], s=16, alpha=0.7
-)
-cbar = plt.colorbar(sc)
-cbar.set_label("FPro (processing level)")
-
-plt.xlabel("Sugar (g per 100g)")
-plt.ylabel("Fiber (g per 100g)")
-plt.title("Processing ↑, fiber ↓, sugars ↑ — especially in snacks and cereals")
-plt.figtext(
-    0.5, -0.05,
-    f"Filtered to snacks*, cereal, and drink* categories (n={len(d1)}). Each point is a product.",
-    ha="center", fontsize=9
-)
-plt.tight_layout()
-plt.savefig(OUT_PLOT1, dpi=200, bbox_inches="tight")
-plt.close()
+def make_plot1(df: pd.DataFrame):
+    # Match against the (few) category labels, then select rows by category code
+    cats = df["category"].cat.categories.str.lower()
+    mask_snacks = cats.str.startswith("snacks-")
+    mask_cereal = cats.str.contains("cereal") | (cats == "breakfast")
+    mask_drinks = cats.str.startswith("drink-") | cats.str.contains("soda")
+    match_ids = np.where(mask_snacks | mask_cereal | mask_drinks)[0]
+
+    mask_plot1 = np.isin(df["category"].cat.codes.to_numpy(), match_ids)
+
+    d1 = df.loc[
+        mask_plot1,
+        ["Sugars, total", "Fiber, total dietary", "FPro"]
+    ].dropna()
+
+    plt.figure(figsize=(8.5, 6.8))
+    sc = plt.scatter(
+        d1["Sugars, total"], d1["Fiber, total dietary"],
+        c=d1["FPro"], s=16, alpha=0.7
+    )
+    cbar = plt.colorbar(sc)
+    cbar.set_label("FPro (processing level)")
+
+    plt.xlabel("Sugar (g per 100g)")
+    plt.ylabel("Fiber (g per 100g)")
+    plt.title("Processing ↑, fiber ↓, sugars ↑ — especially in snacks and cereals")
+    plt.figtext(
+        0.5, 0.015,
+        f"Filtered to snacks*, cereal, and drink* categories (n={len(d1)}). Each point is a product.",
+        ha="center", fontsize=9
+    )
+    plt.subplots_adjust(left=0.09, right=0.98, bottom=0.12, top=0.94)
+    plt.savefig(OUT_PLOT1, dpi=DPI)
+    plt.close()
+    return OUT_PLOT1
+
 
 # -----------------------------
 # PLOT 2 — Price vs Processing (category premiums)
 # Compare median price_percal of Class 0 vs Class 3 by category
 # EXCLUDE drink-* categories to avoid $/kcal blow-ups from ~0 kcal
 # -----------------------------
-d2 = df.loc[
-    df["FPro_class_int"].isin([0, 3]) &
-    (~df["category"].str.lower().str.startswith("drink-")),
-    ["category", "FPro_class_int", "price_percal"]
-].dropna()
-
-if d2.empty:
-    print("WARNING: No rows available for Plot 2 after filtering. Skipping this plot.")
-else:
-    med = d2.groupby(["category", "FPro_class_int"], as_index=False)["price_percal"].median()
+def make_plot2(df: pd.DataFrame):
+    # Match "drink-" against the (few) category labels, then select rows by category code
+    drink_ids = np.where(df["category"].cat.categories.str.lower().str.startswith("drink-"))[0]
+    is_drink = np.isin(df["category"].cat.codes.to_numpy(), drink_ids)
+
+    d2 = df.loc[
+        df["FPro_class_int"].isin([0, 3]) & ~is_drink,
+        ["category", "FPro_class_int", "price_percal"]
+    ].dropna()
+
+    if d2.empty:
+        print("WARNING: No rows available for Plot 2 after filtering. Skipping this plot.")
+        return None
+
+    # Both keys categorical; observed=True/sort=False skip empty combinations and key sorting
+    d2["FPro_class_int"] = d2["FPro_class_int"].astype("category")
+    med = d2.groupby(["category", "FPro_class_int"], observed=True, sort=False, as_index=False)["price_percal"].median()
     pv = med.pivot(index="category", columns="FPro_class_int", values="price_percal")
     pv = pv.rename(columns={0: "class0", 3: "class3"}).dropna(subset=["class0", "class3"])
     pv["delta"] = pv["class0"] - pv["class3"]
     pv = pv.sort_values("delta", ascending=True)
 
-    fig, ax = plt.subplots(figsize=(9.5, max(4.2, 0.24 * len(pv))))
+    fig_h = max(4.2, 0.24 * len(pv))
+    fig, ax = plt.subplots(figsize=(9.5, fig_h))
     ypos = np.arange(len(pv))
 
     ax.hlines(y=ypos, xmin=pv["class3"], xmax=pv["class0"], linewidth=1)
@@ -129,74 +185,128 @@ else:
 
     # Annotate top 5 categories where Class 0 is more expensive
     top5 = pv.nlargest(5, "delta")
+    pos = {c: i for i, c in enumerate(pv.index)}  # category -> y position
     for cat, row in top5.iterrows():
-        y = pv.index.get_loc(cat)
+        y = pos[cat]
         ax.text(max(row["class0"], row["class3"]) * 1.02, y, f"Δ={row['delta']:.4f}",
                 va="center", fontsize=8)
 
     fig.text(
-        0.5, -0.03,
+        0.5, 0.12 / fig_h,
         "Δ = median(Class 0) – median(Class 3) price_percal; beverages excluded to avoid $/kcal inflation.",
         ha="center", fontsize=9
     )
-    plt.tight_layout()
-    plt.savefig(OUT_PLOT2, dpi=200, bbox_inches="tight")
+    # Fixed margins in inches (figure height scales with the number of categories);
+    # the wide left margin holds the long category labels, the right one the Δ notes
+    fig.subplots_adjust(left=0.25, right=0.9, bottom=0.85 / fig_h, top=1 - 0.4 / fig_h)
+    plt.savefig(OUT_PLOT2, dpi=DPI)
     plt.close()
+    return OUT_PLOT2
+
+
+def minor_log_labels(lo: float, hi: float):
+    # Which 2..9 x 10^k ticks to label for a view of [lo, hi] in log10 units, following
+    # matplotlib's LogFormatter: none past one decade boundary, a subset over 0.4 decades
+    if np.floor(hi) - np.floor(np.nextafter(lo, -np.inf)) > 1:
+        shown = set()
+    elif hi - lo > 0.4:
+        shown = {2, 3, 4, 6}
+    else:
+        shown = set(range(2, 10))
+
+    def label(v, _):
+        k = np.floor(v + 1e-9)
+        c = int(round(10 ** (v - k)))
+        return f"${c}\\times10^{{{k:.0f}}}$" if c in shown else ""
+    return label
+
 
 # -----------------------------
 # PLOT 3 — Store × FPro_class medians (grouped bars, log y)
 # -----------------------------
-d3 = df[["store", "FPro_class_int", "price_percal"]].dropna()
-grp = d3.groupby(["store", "FPro_class_int"], as_index=False)["price_percal"].median()
-
-stores = list(grp["store"].unique())
-classes = sorted([int(c) for c in grp["FPro_class_int"].dropna().unique()])
-
-barw = 0.12 if len(classes) > 1 else 0.35
-x = np.arange(len(stores))
-fig, ax = plt.subplots(figsize=(10, 6))
-
-for i, cls in enumerate(classes):
-    # y-values per store for this class
-    yvals = []
-    for st in stores:
-        sel = grp[(grp["store"] == st) & (grp["FPro_class_int"] == cls)]
-        yvals.append(float(sel["price_percal"].iloc[0]) if not sel.empty else np.nan)
-    # position bars centered around each x
-    ax.bar(x + (i - len(classes)/2) * barw + barw/2, yvals, width=barw, label=f"FPro class {cls}")
-
-ax.set_xticks(x)
-ax.set_xticklabels(stores)
-ax.set_yscale("log")  # wide range readability
-ax.set_ylabel("Median price per calorie (USD per kcal, log scale)")
-ax.set_title("Where should budget-conscious shoppers go for minimally processed food?")
-ax.legend(title="Processing class", ncols=min(4, len(classes)), fontsize=8, title_fontsize=9)
-
-fig.text(
-    0.5, -0.03,
-    "Median price per calorie by store and processing class. Log scale clarifies cross-store differences.",
-    ha="center", fontsize=9
-)
-plt.tight_layout()
-plt.savefig(OUT_PLOT3, dpi=200, bbox_inches="tight")
-plt.close()
+def make_plot3(df: pd.DataFrame):
+    d3 = df[["store", "FPro_class_int", "price_percal"]].dropna()
+    d3["FPro_class_int"] = d3["FPro_class_int"].astype("category")
+    grp = d3.groupby(["store", "FPro_class_int"], observed=True, sort=False, as_index=False)["price_percal"].median()
 
-# -----------------------------
-# PRINT A READY-TO-PASTE RATIONALE PARAGRAPH FOR PLOT 1
-# -----------------------------
-rationale = (
-    "I prefer the sugar–fiber scatterplot colored by FPro because it communicates a clear, "
-    "nutrition-relevant pattern using the strongest encodings: position for two quantitative variables "
-    "and color for processing level. By focusing on snacks, cereals, and beverages, the plot highlights "
-    "familiar products where processing often correlates with higher sugars and lower fiber—making the "
-    "takeaway easy for a general audience. The visible clustering of high-FPro points in the low-fiber/"
-    "high-sugar region supports the narrative that more processed items tend to have poorer fiber–sugar "
-    "profiles. Axis labels with units, a concise takeaway title, and the colorbar anchor interpretation, "
-    "balancing explanatory power and readability without overplotting."
-)
-print("\n--- Copy/Paste for your checkpoint (Plot 1 rationale) ---\n")
-print(rationale)
-print("\nSaved figures:")
-print(f"  1) {OUT_PLOT1}")
-print(f"  2) {OUT_PLOT2}")
-print(f"  3) {OUT_PLOT3}")
+    stores = sorted(grp["store"].unique())
+    classes = sorted([int(c) for c in grp["FPro_class_int"].dropna().unique()])
+
+    # store × class matrix of medians (NaN where a store has no items in a class)
+    mat = (
+        grp.pivot(index="store", columns="FPro_class_int", values="price_percal")
+           .reindex(index=stores, columns=classes)
+           .to_numpy(dtype=float, na_value=np.nan)
+    )
+    # Log scale done up front: bars are drawn in log10 units on a linear axis.
+    # Non-positive medians have no log and are left out, as the log axis masked them
+    with np.errstate(divide="ignore", invalid="ignore"):
+        log_mat = np.where(mat > 0, np.log10(mat), np.nan)
+    lo, hi = np.nanmin(log_mat), np.nanmax(log_mat)
+    pad = 0.05 * (hi - lo) or 0.05  # same 5% margin autoscaling gives a log axis
+    ymin, ymax = lo - pad, hi + pad
+
+    barw = 0.12 if len(classes) > 1 else 0.35
+    x = np.arange(len(stores))
+    fig, ax = plt.subplots(figsize=(10, 6))
+
+    for i, cls in enumerate(classes):
+        # position bars centered around each x
+        ax.bar(x + (i - len(classes)/2) * barw + barw/2, log_mat[:, i] - ymin, bottom=ymin,
+               width=barw, label=f"FPro class {cls}")
+
+    ax.set_xticks(x)
+    ax.set_xticklabels(stores)
+    # wide range readability: decade ticks labelled 10^k, 2..9 minor ticks labelled like LogFormatter
+    ax.set_ylim(ymin, ymax)
+    ax.yaxis.set_major_locator(MultipleLocator(1))
+    ax.yaxis.set_major_formatter(FuncFormatter(lambda v, _: f"$10^{{{v:.0f}}}$"))
+    decades = 10.0 ** np.arange(np.floor(ymin), np.ceil(ymax))
+    ax.yaxis.set_minor_locator(FixedLocator(np.log10(np.outer(decades, np.arange(2, 10))).ravel()))
+    ax.yaxis.set_minor_formatter(FuncFormatter(minor_log_labels(ymin, ymax)))
+    ax.set_ylabel("Median price per calorie (USD per kcal, log scale)")
+    ax.set_title("Where should budget-conscious shoppers go for minimally processed food?")
+    ax.legend(title="Processing class", ncols=min(4, len(classes)), fontsize=8, title_fontsize=9)
+
+    fig.text(
+        0.5, 0.015,
+        "Median price per calorie by store and processing class. Log scale clarifies cross-store differences.",
+        ha="center", fontsize=9
+    )
+    fig.subplots_adjust(left=0.1, right=0.98, bottom=0.13, top=0.94)
+    plt.savefig(OUT_PLOT3, dpi=DPI)
+    plt.close()
+    return OUT_PLOT3
+
+
+def main():
+    df = load_data()
+
+    # The three plots only share the cleaned frame: render them in parallel
+    with ProcessPoolExecutor(3) as ex:
+        futures = [ex.submit(make_plot, df) for make_plot in (make_plot1, make_plot2, make_plot3)]
+        saved = [f.result() for f in futures]
+
+    # -----------------------------
+    # PRINT A READY-TO-PASTE RATIONALE PARAGRAPH FOR PLOT 1
+    # -----------------------------
+    rationale = (
+        "I prefer the sugar–fiber scatterplot colored by FPro because it communicates a clear, "
+        "nutrition-relevant pattern using the strongest encodings: position for two quantitative variables "
+        "and color for processing level. By focusing on snacks, cereals, and beverages, the plot highlights "
+        "familiar products where processing often correlates with higher sugars and lower fiber—making the "
+        "takeaway easy for a general audience. The visible clustering of high-FPro points in the low-fiber/"
+        "high-sugar region supports the narrative that more processed items tend to have poorer fiber–sugar "
+        "profiles. Axis labels with units, a concise takeaway title, and the colorbar anchor interpretation, "
+        "balancing explanatory power and readability without overplotting."
+    )
+    print("\n--- Copy/Paste for your checkpoint (Plot 1 rationale) ---\n")
+    print(rationale)
+    print("\nSaved figures:")
+    for i, out in enumerate(saved, start=1):
+        if out:
+            print(f"  {i}) {out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,12 +2,22 @@
 # DSC 209R Project 1 — Points-only scatter with quantized FPro bands + **linear axes**
 
 import sys
+import argparse
 from pathlib import Path
 import pandas as pd
 
+# Shared helpers (prep.py, one level up); also switches on Copy-on-Write
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from prep import add_category_lookup, chart_data, chart_rows, load_with_polars, save_chart
+
 # ---------- Config ----------
 INPUT_CSV = "../grocerydb.csv"          # adjust if needed
 HTML_OUT  = "final_project1_altair_quantized_linear.html"
+DATA_OUT  = "final_project1_altair_quantized_linear.csv"
+AGGREGATE_POINTS = True   # True = one mark per occupied Sugar×Fiber grid cell; False = one per product
+GRID_BINS = 150           # grid resolution per axis when aggregating
+CHART_DECIMALS = 3        # decimals kept in the chart data (spec/CSV size)
+EXTERNAL_DATA = False     # True = chart rows in a sibling CSV loaded by URL (must be viewed over http); False = inline in the HTML
 
 # ---------- Altair import ----------
 try:
@@ -19,68 +29,22 @@ except ModuleNotFoundError:
         "Then re-run:  python Final_quantized_linear.py"
     )
 
-def load_and_prepare(csv_path: Path) -> pd.DataFrame:
-    if not csv_path.exists():
-        sys.exit(f"ERROR: Could not find {csv_path.name} next to this script.")
-
-    df = pd.read_csv(csv_path)
-
-    required = [
-        "name", "category", "FPro", "Protein", "Total Fat", "Carbohydrate",
-        "Sugars, total", "Fiber, total dietary"
-    ]
-    missing = [c for c in required if c not in df.columns]
-    if missing:
-        sys.exit(f"ERROR: Missing required columns: {missing}")
-
-    # Standardize names used in the chart
-    df = df.rename(columns={"Sugars, total": "Sugar", "Fiber, total dietary": "Fiber"})
-
-    # Filter out zero-kcal beverages (e.g., water/unsweetened drinks)
-    cat_lower = df["category"].astype(str).str.lower()
-    zero_macros = (
-        df["Protein"].fillna(0).eq(0)
-        & df["Total Fat"].fillna(0).eq(0)
-        & df["Carbohydrate"].fillna(0).eq(0)
-    )
-    df = df[~(cat_lower.str.startswith("drink-") & zero_macros)].copy()
-
-    # Drop rows with missing key fields
-    df = df.dropna(subset=["Sugar", "Fiber", "Protein", "Total Fat", "Carbohydrate", "FPro"])
-
-    # Gentle plausibility checks
-    df = df[(df["Sugar"] >= 0) & (df["Fiber"] >= 0) &
-            (df["Protein"] >= 0) & (df["Total Fat"] >= 0) & (df["Carbohydrate"] >= 0)]
-    df = df[df["Sugar"] <= df["Carbohydrate"]]
-    df = df[df["Fiber"] <= df["Carbohydrate"]]
-    df["macro_sum"] = df["Protein"] + df["Total Fat"] + df["Carbohydrate"]
-    df = df[df["macro_sum"] <= 110]
-
-    # Calories per 100 g (computed, not encoded)
-    df["Calories_per_100g"] = 4*df["Protein"] + 4*df["Carbohydrate"] + 9*df["Total Fat"]
-
-    # ----- Quantize FPro into 6 visually separated bands (ordered categorical) -----
-    bins   = [-0.001, 0.125, 0.25, 0.375, 0.50, 0.675, 0.75, 0.875, 1.00]
-    labels = ["0-0.125", "0.125-0.25", "0.25-0.375", "0.375-0.50", "0.50-0.675", "0.675-0.75", "0.75-0.875", "0.875-1.00"]
-    df["FPro_band6"] = pd.cut(df["FPro"], bins=bins, labels=labels, include_lowest=True)
-    df["FPro_band6"] = df["FPro_band6"].astype(
-        pd.CategoricalDtype(categories=labels, ordered=True)
-    )
-
-    # Strings
-    df["name"] = df["name"].astype(str)
-    df["category"] = df["category"].astype(str)
-    return df
-
 def make_chart(df: pd.DataFrame) -> alt.Chart:
     alt.data_transformers.disable_max_rows()
 
     # High-contrast palette: light green → deep blue
     palette = ["#7cfc00", "#00e966", "#00d0a4", "#00b5d7", "#0097f8", "#0076fc", "#004fe0", "#0014a8"]
 
+    data, tooltip, category_lut = chart_rows(df, GRID_BINS, aggregate=AGGREGATE_POINTS, band="FPro_band6")
+    if AGGREGATE_POINTS:
+        # ~4k grid-cell marks instead of ~25k product marks; denser cells are more opaque
+        opacity = alt.Opacity("n:Q", scale=alt.Scale(type="log", range=[0.35, 0.9]), legend=None)
+    else:
+        opacity = alt.value(0.55)
+
     pts = (
-        alt.Chart(df)
-          .mark_circle(size=100, opacity=0.55, stroke="white", strokeWidth=0.25)
+        alt.Chart(chart_data(data, DATA_OUT, CHART_DECIMALS, external=EXTERNAL_DATA))
+          .mark_circle(size=100, stroke="white", strokeWidth=0.25)
           .encode(
               # LINEAR axes (default) — no scale type provided
               x=alt.X("Sugar:Q", title="Sugar (g per 100 g)"),
@@ -92,23 +56,19 @@ def make_chart(df: pd.DataFrame) -> alt.Chart:
                   scale=alt.Scale(domain=list(df["FPro_band6"].cat.categories), range=palette),
                   sort=None
               ),
-              tooltip=[
-                  "name:N", "category:N",
-                  alt.Tooltip("FPro:Q", title="FPro"),
-                  alt.Tooltip("FPro_band6:N", title="FPro band"),
-                  alt.Tooltip("Sugar:Q", title="Sugar (g/100 g)"),
-                  alt.Tooltip("Fiber:Q", title="Fiber (g/100 g)"),
-                  alt.Tooltip("Calories_per_100g:Q", title="Calories per 100 g"),
-              ],
+              opacity=opacity,
+              tooltip=tooltip,
           )
           .properties(width=760, height=520)
     )
+    pts = add_category_lookup(pts, category_lut)
 
     title = "Processing ↑ is associated with higher sugar and lower fiber across grocery foods"
     chart = pts.properties(title=title)
 
     caption_text = (
         "Quantized FPro into 6 bands for higher color contrast; "
+        f"{f'points binned to a {GRID_BINS}×{GRID_BINS} grid (opacity ∝ log count); ' if AGGREGATE_POINTS else ''}"
         "filtered out zero-kcal beverages; dropped rows with missing key nutrients; "
         "removed implausible values (sugar/fiber ≤ carbs; macros ≤ 110 g/100 g)."
     )
@@ -122,19 +82,15 @@ def make_chart(df: pd.DataFrame) -> alt.Chart:
     return alt.vconcat(chart, caption, spacing=6)
 
 def main():
-    df = load_and_prepare(Path(INPUT_CSV))
-    chart = make_chart(df)
-    chart.save(HTML_OUT)
-    print(f"Saved: {HTML_OUT}\nOpen this file in your browser to view the chart.")
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--export-static", action="store_true",
+                    help="also write PNG and SVG (slow; needs vl-convert-python)")
+    args = ap.parse_args()
 
-    # Optional static exports
-    try:
-        from altair_saver import save as alt_save
-        alt_save(chart, "final_project1_altair_quantized_linear.png", scale_factor=2)
-        alt_save(chart, "final_project1_altair_quantized_linear.svg")
-        print("Also saved PNG and SVG.")
-    except Exception:
-        pass
+    df = load_with_polars(Path(INPUT_CSV), with_fpro_band6=True)
+    chart = make_chart(df)
+    save_chart(chart, HTML_OUT, "final_project1_altair_quantized_linear", export_static=args.export_static,
+               external_data=EXTERNAL_DATA)
 
 if __name__ == "__main__":
     main()
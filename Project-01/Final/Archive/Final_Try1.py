@@ -3,11 +3,23 @@
 # Output: final_project1_altair_v3_points.html
 
 import sys
+import argparse
 from pathlib import Path
+import numpy as np
 import pandas as pd
 
+# Shared helpers (prep.py, one level up); also switches on Copy-on-Write
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from prep import add_category_lookup, chart_data, chart_rows, load_with_polars, round_for_chart, save_chart
+
 INPUT_CSV = "grocerydb.csv"
 HTML_OUT  = "final_project1_altair_v3_points.html"
+DATA_OUT  = "final_project1_altair_v3_points.csv"
+TREND_OUT = "final_project1_altair_v3_points_trend.csv"
+AGGREGATE_POINTS = True   # True = one mark per occupied Sugar×Fiber grid cell; False = one per product
+GRID_BINS = 150           # grid resolution per axis when aggregating
+CHART_DECIMALS = 3        # decimals kept in the chart data (spec/CSV size)
+EXTERNAL_DATA = False     # True = chart rows in a sibling CSV loaded by URL (must be viewed over http); False = inline in the HTML
 
 try:
     import altair as alt
@@ -18,80 +30,63 @@ except ModuleNotFoundError:
         "Re-run: python Final_v3_points_only.py"
     )
 
-def load_and_clean(csv_path: Path) -> pd.DataFrame:
-    if not csv_path.exists():
-        sys.exit(f"ERROR: Missing {csv_path.name} next to this script.")
-
-    df = pd.read_csv(csv_path)
+# Optional: precompute the LOESS trend in Python (else Vega fits it in the browser)
+try:
+    from statsmodels.nonparametric.smoothers_lowess import lowess
+except ModuleNotFoundError:
+    lowess = None
 
-    needed = [
-        "name", "category", "FPro", "Protein", "Total Fat", "Carbohydrate",
-        "Sugars, total", "Fiber, total dietary"
+def build_annotations(df: pd.DataFrame) -> pd.DataFrame:
+    texts = [
+        "Minimally processed cluster\n(low sugar, little/no fiber)",
+        "Ultra-processed sweets\n(high sugar, little fiber)",
+        "High-fiber whole foods\n(higher fiber, lower sugar)",
     ]
-    miss = [c for c in needed if c not in df.columns]
-    if miss:
-        sys.exit(f"ERROR: Missing required columns: {miss}")
-
-    df = df.rename(columns={"Sugars, total": "Sugar", "Fiber, total dietary": "Fiber"})
-
-    # Filter out zero-kcal beverages to avoid meaningless 0/0 piles
-    cat_lower = df["category"].astype(str).str.lower()
-    zero_macros = (
-        df["Protein"].fillna(0).eq(0)
-        & df["Total Fat"].fillna(0).eq(0)
-        & df["Carbohydrate"].fillna(0).eq(0)
+    # The three regions are disjoint, so one region code per row (-1 = none)
+    # lets a single groupby compute every cluster median
+    region = np.select(
+        [
+            (df["FPro"] <= 0.15) & (df["Sugar"] <= 5) & (df["Fiber"] <= 5),
+            (df["FPro"] >= 0.85) & (df["Sugar"] >= 25) & (df["Fiber"] <= 2),
+            (df["FPro"] <= 0.35) & (df["Fiber"] >= 6) & (df["Sugar"] <= 15),
+        ],
+        range(len(texts)),
+        default=-1,
     )
-    df = df[~(cat_lower.str.startswith("drink-") & zero_macros)].copy()
-
-    # Drop rows with missing key fields
-    df = df.dropna(subset=["Sugar", "Fiber", "Protein", "Total Fat", "Carbohydrate", "FPro"])
-
-    # Gentle plausibility screens
-    df = df[(df["Sugar"] >= 0) & (df["Fiber"] >= 0) &
-            (df["Protein"] >= 0) & (df["Total Fat"] >= 0) & (df["Carbohydrate"] >= 0)]
-    df = df[df["Sugar"] <= df["Carbohydrate"]]
-    df = df[df["Fiber"] <= df["Carbohydrate"]]
-    df["macro_sum"] = df["Protein"] + df["Total Fat"] + df["Carbohydrate"]
-    df = df[df["macro_sum"] <= 110]
-
-    df["name"] = df["name"].astype(str)
-    df["category"] = df["category"].astype(str)
-    return df
-
-def build_annotations(df: pd.DataFrame) -> pd.DataFrame:
-    def med(sub):
-        if sub.empty: return None
-        return {"x": float(sub["Sugar"].median()), "y": float(sub["Fiber"].median())}
-
-    ann = []
-
-    mp = df[(df["FPro"] <= 0.15) & (df["Sugar"] <= 5) & (df["Fiber"] <= 5)]
-    pt = med(mp)
-    if pt:
-        pt["text"] = "Minimally processed cluster\n(low sugar, little/no fiber)"
-        ann.append(pt)
-
-    ups = df[(df["FPro"] >= 0.85) & (df["Sugar"] >= 25) & (df["Fiber"] <= 2)]
-    pt = med(ups)
-    if pt:
-        pt["text"] = "Ultra-processed sweets\n(high sugar, little fiber)"
-        ann.append(pt)
-
-    hf = df[(df["FPro"] <= 0.35) & (df["Fiber"] >= 6) & (df["Sugar"] <= 15)]
-    pt = med(hf)
-    if pt:
-        pt["text"] = "High-fiber whole foods\n(higher fiber, lower sugar)"
-        ann.append(pt)
+    in_region = region >= 0
+    meds = df.loc[in_region, ["Sugar", "Fiber"]].groupby(region[in_region]).median()
 
+    ann = [
+        {"x": float(r.Sugar), "y": float(r.Fiber), "text": texts[r.Index]}
+        for r in meds.itertuples()
+    ]
     return pd.DataFrame(ann) if ann else pd.DataFrame(columns=["x","y","text"])
 
+def loess_trend(df: pd.DataFrame, n_points: int = 200) -> pd.DataFrame:
+    # Same fit as transform_loess("Sugar","Fiber", bandwidth=0.25), done once here
+    # (it=2 matches Vega's two robustness passes); delta skips refitting at near-identical
+    # x values. The curve is resampled on an even Sugar grid so only n_points rows ship.
+    sugar = df["Sugar"].to_numpy(np.float64)
+    fiber = df["Fiber"].to_numpy(np.float64)
+    sm = lowess(fiber, sugar, frac=0.25, it=2, delta=0.01 * float(np.ptp(sugar)), return_sorted=True)
+    x, first = np.unique(sm[:, 0], return_index=True)
+    grid = np.linspace(x[0], x[-1], n_points)
+    return pd.DataFrame({"Sugar": grid, "Fiber": np.interp(grid, x, sm[first, 1])})
+
 def make_chart(df: pd.DataFrame, annotations: pd.DataFrame):
     alt.data_transformers.disable_max_rows()
 
+    data, tooltip, category_lut = chart_rows(df, GRID_BINS, aggregate=AGGREGATE_POINTS)
+    if AGGREGATE_POINTS:
+        # ~2k grid-cell marks instead of ~25k product marks; denser cells are more opaque
+        opacity = alt.Opacity("n:Q", scale=alt.Scale(type="log", range=[0.25, 0.8]), legend=None)
+    else:
+        opacity = alt.value(0.38)
+
     # Tiny jitter near 0 to separate stacks; leaves values visually unchanged
     # Vega expressions allow random()
     jittered = (
-        alt.Chart(df)
+        alt.Chart(chart_data(data, DATA_OUT, CHART_DECIMALS, external=EXTERNAL_DATA))
           .transform_calculate(
               Sugar_jit="datum.Sugar + (datum.Sugar < 2 ? (random()-0.5)*0.6 : 0)",
               Fiber_jit="datum.Fiber + (datum.Fiber < 2 ? (random()-0.5)*0.6 : 0)"
@@ -100,27 +95,29 @@ def make_chart(df: pd.DataFrame, annotations: pd.DataFrame):
 
     pts = (
         jittered
-          .mark_circle(size=18, opacity=0.38, stroke="white", strokeWidth=0.25)
+          .mark_circle(size=18, stroke="white", strokeWidth=0.25)
           .encode(
               x=alt.X("Sugar_jit:Q", title="Sugar (g per 100 g)"),
               y=alt.Y("Fiber_jit:Q", title="Fiber (g per 100 g)"),
               color=alt.Color("FPro:Q", title="Processing level (FPro)",
                               scale=alt.Scale(domain=[0,1], scheme="viridis")),
-              tooltip=["name","category",
-                       alt.Tooltip("FPro:Q", title="FPro"),
-                       alt.Tooltip("Sugar:Q", title="Sugar (g/100 g)"),
-                       alt.Tooltip("Fiber:Q", title="Fiber (g/100 g)")]
+              opacity=opacity,
+              tooltip=tooltip
           )
           .properties(width=760, height=520)
     )
+    pts = add_category_lookup(pts, category_lut)
 
     # LOESS uses the true values (no jitter) for a faithful trend
-    trend = (
-        alt.Chart(df)
-          .transform_loess("Sugar","Fiber", bandwidth=0.25)
-          .mark_line()
-          .encode(x="Sugar:Q", y="Fiber:Q")
-    )
+    if lowess is not None:
+        trend = alt.Chart(round_for_chart(loess_trend(df), CHART_DECIMALS)).mark_line().encode(x="Sugar:Q", y="Fiber:Q")
+    else:
+        trend = (
+            alt.Chart(chart_data(df[["Sugar", "Fiber"]], TREND_OUT, CHART_DECIMALS, external=EXTERNAL_DATA))
+              .transform_loess("Sugar","Fiber", bandwidth=0.25)
+              .mark_line()
+              .encode(x="Sugar:Q", y="Fiber:Q")
+        )
 
     text = (
         alt.Chart(annotations).mark_text(align="left", dx=6, dy=-6)
@@ -133,6 +130,7 @@ def make_chart(df: pd.DataFrame, annotations: pd.DataFrame):
     caption = (
         "Filtered out zero-kcal beverages; dropped rows with missing key nutrients; "
         "removed implausible values (sugar/fiber ≤ carbs; macros ≤ 110 g/100 g)."
+        f"{f' Points binned to a {GRID_BINS}×{GRID_BINS} grid (opacity ∝ log count).' if AGGREGATE_POINTS else ''}"
     )
 
     main = (pts + trend + text).properties(title=title)
@@ -146,20 +144,16 @@ def make_chart(df: pd.DataFrame, annotations: pd.DataFrame):
     return alt.vconcat(main, caption_mark, spacing=6)
 
 def main():
-    df = load_and_clean(Path(INPUT_CSV))
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--export-static", action="store_true",
+                    help="also write PNG and SVG (slow; needs vl-convert-python)")
+    args = ap.parse_args()
+
+    df = load_with_polars(Path(INPUT_CSV))
     annotations = build_annotations(df)
     chart = make_chart(df, annotations)
-    chart.save(HTML_OUT)
-    print(f"Saved: {HTML_OUT}\nOpen in a browser to view the chart.")
-
-    # Optional static exports if deps are present
-    try:
-        from altair_saver import save as alt_save
-        alt_save(chart, "final_project1_altair_v3_points.png", scale_factor=2)
-        alt_save(chart, "final_project1_altair_v3_points.svg")
-        print("Also saved PNG and SVG.")
-    except Exception:
-        pass
+    save_chart(chart, HTML_OUT, "final_project1_altair_v3_points", export_static=args.export_static,
+               external_data=EXTERNAL_DATA, canvas=True)
 
 if __name__ == "__main__":
     main()
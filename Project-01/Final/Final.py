@@ -3,12 +3,20 @@
 # Idea: Processing ↑ is associated with higher sugar and lower fiber across grocery foods
 
 import sys
+import argparse
 from pathlib import Path
+import numpy as np
 import pandas as pd
 
+# Shared load + clean step (prep.py); also switches on Copy-on-Write
+from prep import add_category_lookup, chart_rows, enable_data_transformer, load_and_prepare, round_for_chart, save_chart
+
 # --------- Config ---------
 INPUT_CSV = "../grocerydb.csv"
 HTML_OUT = "final_project1_altair_2.html"
+AGGREGATE_POINTS = True   # True = one mark per occupied Sugar×Fiber grid cell; False = one per product
+GRID_BINS = 150           # grid resolution per axis when aggregating
+CHART_DECIMALS = 3        # decimals kept in the chart data (spec/CSV size)
 NATURE_SANS = "Helvetica Neue, Helvetica, Arial, sans-serif"
 
 # --------- Altair import with helpful error if missing ---------
@@ -21,93 +29,48 @@ except ModuleNotFoundError:
         "Then re-run:  python Final.py"
     )
 
-def load_and_prepare(csv_path: Path) -> pd.DataFrame:
-    if not csv_path.exists():
-        sys.exit(f"ERROR: Could not find {csv_path.name} next to this script.")
-
-    df = pd.read_csv(csv_path)
-
-    # Ensure expected columns exist
-    required = [
-        "name", "category", "FPro", "Protein", "Total Fat", "Carbohydrate",
-        "Sugars, total", "Fiber, total dietary"
+def build_annotations(df: pd.DataFrame) -> pd.DataFrame:
+    texts = [
+        # Minimally processed cluster: low FPro, low sugar/fiber (e.g., meats/eggs)
+        "Minimally processed cluster\n(low sugar, little/no fiber)",
+        # Ultra-processed sweets: high FPro, high sugar, low fiber
+        "Ultra-processed sweets\n(high sugar, little fiber)",
+        # High-fiber whole foods: low-ish FPro, higher fiber, lower sugar
+        "High-fiber whole foods\n(higher fiber, lower sugar)",
     ]
-    missing = [c for c in required if c not in df.columns]
-    if missing:
-        sys.exit(f"ERROR: Missing required columns: {missing}")
-
-    # Convenience rename
-    df = df.rename(columns={"Sugars, total": "Sugar", "Fiber, total dietary": "Fiber"})
-
-    # Filter out obvious non-food zero-kcal beverages
-    cat_lower = df["category"].astype(str).str.lower()
-    zero_macros = (
-        df["Protein"].fillna(0).eq(0)
-        & df["Total Fat"].fillna(0).eq(0)
-        & df["Carbohydrate"].fillna(0).eq(0)
+    # The three regions are disjoint, so one region code per row (-1 = none)
+    # lets a single groupby compute every cluster median
+    s, fb, fp = (df[k].to_numpy() for k in ["Sugar", "Fiber", "FPro"])
+    region = np.select(
+        [
+            (fp <= 0.15) & (s <= 5) & (fb <= 5),
+            (fp >= 0.85) & (s >= 25) & (fb <= 2),
+            (fp <= 0.35) & (fb >= 6) & (s <= 15),
+        ],
+        range(len(texts)),
+        default=-1,
     )
-    df = df[~(cat_lower.str.startswith("drink-") & zero_macros)].copy()
-
-    # Drop rows missing key fields
-    df = df.dropna(subset=["Sugar", "Fiber", "Protein", "Total Fat", "Carbohydrate", "FPro"])
-
-    # Basic plausibility filters (keep this gentle to avoid over-pruning)
-    df = df[(df["Sugar"] >= 0) & (df["Fiber"] >= 0) &
-            (df["Protein"] >= 0) & (df["Total Fat"] >= 0) & (df["Carbohydrate"] >= 0)]
-    df = df[df["Sugar"] <= df["Carbohydrate"]]
-    df = df[df["Fiber"] <= df["Carbohydrate"]]
-    df["macro_sum"] = df["Protein"] + df["Total Fat"] + df["Carbohydrate"]
-    df = df[df["macro_sum"] <= 110]
-    df = df[(df["Sugar"] <= 90) & (df["Fiber"] <= 49.9)]
-
-    print(f"N (after filters & trims): {len(df):,}")
-
-    # Calories per 100 g for size encoding (4/4/9 rule)
-    df["Calories_per_100g"] = 4 * df["Protein"] + 4 * df["Carbohydrate"] + 9 * df["Total Fat"]
-
-    # Clean category/name to strings
-    df["category"] = df["category"].astype(str)
-    df["name"] = df["name"].astype(str)
-
-    return df
-
-def build_annotations(df: pd.DataFrame) -> pd.DataFrame:
-    def median_point(sub):
-        if sub.empty:
-            return None
-        return {"x": float(sub["Sugar"].median()), "y": float(sub["Fiber"].median())}
-
-    annos = []
-
-    # Minimally processed cluster: low FPro, low sugar/fiber (e.g., meats/eggs)
-    mp = df[(df["FPro"] <= 0.15) & (df["Sugar"] <= 5) & (df["Fiber"] <= 5)]
-    pt = median_point(mp)
-    if pt:
-        pt["text"] = "Minimally processed cluster\n(low sugar, little/no fiber)"
-        annos.append(pt)
-
-    # Ultra-processed sweets: high FPro, high sugar, low fiber
-    ups = df[(df["FPro"] >= 0.85) & (df["Sugar"] >= 25) & (df["Fiber"] <= 2)]
-    pt = median_point(ups)
-    if pt:
-        pt["text"] = "Ultra-processed sweets\n(high sugar, little fiber)"
-        annos.append(pt)
-
-    # High-fiber whole foods: low-ish FPro, higher fiber, lower sugar
-    hf = df[(df["FPro"] <= 0.35) & (df["Fiber"] >= 6) & (df["Sugar"] <= 15)]
-    pt = median_point(hf)
-    if pt:
-        pt["text"] = "High-fiber whole foods\n(higher fiber, lower sugar)"
-        annos.append(pt)
+    in_region = region >= 0
+    meds = df.loc[in_region, ["Sugar", "Fiber"]].groupby(region[in_region]).median()
 
+    annos = [
+        {"x": float(r.Sugar), "y": float(r.Fiber), "text": texts[r.Index]}
+        for r in meds.itertuples()
+    ]
     return pd.DataFrame(annos) if annos else pd.DataFrame(columns=["x", "y", "text"])
 
 def make_chart(df: pd.DataFrame, annotations: pd.DataFrame) -> alt.Chart:
-    # Let Altair handle large datasets
-    alt.data_transformers.disable_max_rows()
+    enable_data_transformer()
+
+    plot_df, tooltip, category_lut = chart_rows(df, GRID_BINS, aggregate=AGGREGATE_POINTS)
+    if AGGREGATE_POINTS:
+        # ~2k grid-cell marks instead of ~25k product marks; denser cells are more opaque
+        opacity = alt.Opacity("n:Q", scale=alt.Scale(type="log", range=[0.25, 0.8]), legend=None)
+    else:
+        opacity = alt.value(0.35)
 
     # NOTE: fixed-size points (no size encoding)
-    base = alt.Chart(df).mark_circle(size=40, opacity=0.35).encode(
+    base = alt.Chart(round_for_chart(plot_df, CHART_DECIMALS)).mark_circle(size=40).encode(
         x=alt.X("Sugar:Q",
                 title="Sugar (g per 100 g)",
                 axis=alt.Axis(
@@ -133,15 +96,10 @@ def make_chart(df: pd.DataFrame, annotations: pd.DataFrame) -> alt.Chart:
                 gradientThickness=12
             ),
         ),
-        # keep Calories_per_100g in tooltips if you still want to show it on hover
-        tooltip=[
-            "name:N", "category:N",
-            alt.Tooltip("FPro:Q", title="FPro"),
-            alt.Tooltip("Sugar:Q", title="Sugar (g/100 g)", ),
-            alt.Tooltip("Fiber:Q", title="Fiber (g/100 g)"),
-            alt.Tooltip("Calories_per_100g:Q", title="Calories per 100 g")
-        ],
+        opacity=opacity,
+        tooltip=tooltip,
     ).properties(width=700, height=500)
+    base = add_category_lookup(base, category_lut)
 
     title = {
         "text": "The Nutrition Trade-Off: Why Processing Level Predicts Nutritional Quality",
@@ -165,7 +123,8 @@ def make_chart(df: pd.DataFrame, annotations: pd.DataFrame) -> alt.Chart:
 
     footer_left = (
         alt.Chart(pd.DataFrame({
-            "label": ["* n = 25,670 • Removed Implausible, Missing & Extreme Data • Exclude 0-kcal beverages"]
+            "label": ["* n = 25,670 • Removed Implausible, Missing & Extreme Data • Exclude 0-kcal beverages"
+                      + (f" • Binned to a {GRID_BINS}×{GRID_BINS} grid" if AGGREGATE_POINTS else "")]
         }))
         .mark_text(font=NATURE_SANS, align="left", baseline="top", fontSize=10, color="#555", dy=4)
         .encode(text="label:N")
@@ -187,24 +146,17 @@ def make_chart(df: pd.DataFrame, annotations: pd.DataFrame) -> alt.Chart:
 
 
 def main():
-    df = load_and_prepare(Path(INPUT_CSV))
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--export-static", action="store_true",
+                    help="also write PNG and SVG (slow; needs vl-convert-python)")
+    args = ap.parse_args()
+
+    df = load_and_prepare(Path(INPUT_CSV), trim_extremes=True)
+    print(f"N (after filters & trims): {len(df):,}")
     annotations = build_annotations(df)
     chart = make_chart(df, annotations)
 
-    # Always save HTML (works without extra dependencies)
-    chart.save(HTML_OUT)
-    print(f"\nSaved: {HTML_OUT}")
-    print("Open this file in your browser to view the interactive chart.")
-
-    # Optional: try PNG/SVG if altair_saver is available (won't error if missing)
-    try:
-        from altair_saver import save as alt_save  # pip install altair_saver vega-lite vega
-        alt_save(chart, "final_project1_altair.png", scale_factor=2)
-        alt_save(chart, "final_project1_altair.svg")
-        print("Also saved PNG and SVG.")
-    except Exception:
-        # PNG/SVG exporting often requires additional deps; HTML is sufficient for submission/viewing
-        pass
+    save_chart(chart, HTML_OUT, "final_project1_altair", export_static=args.export_static, canvas=True)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
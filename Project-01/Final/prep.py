@@ -0,0 +1,317 @@
+# prep.py
+# Shared load + clean step for the DSC 209R Project 1 Altair scripts
+# (Final.py and Archive/Final_Try2.py, Archive/Final_Try3.py), a Polars loader for
+# the other Archive/ variants, and the chart helpers they all share
+
+import sys
+import hashlib
+from pathlib import Path
+import numpy as np
+import pandas as pd
+
+# Copy-on-Write: filtered frames share column buffers until a column is written
+# (always on from pandas 3, where the option is deprecated)
+if int(pd.__version__.split(".")[0]) < 3:
+    pd.set_option("mode.copy_on_write", True)
+
+# Optional: VegaFusion evaluates the chart's data transforms in Python at save time
+# (pip install "vegafusion[embed]"); without it every row is inlined for the browser
+try:
+    import vegafusion  # noqa: F401
+    HAVE_VEGAFUSION = True
+except ModuleNotFoundError:
+    HAVE_VEGAFUSION = False
+
+# --------- Config ---------
+CACHE_DIR = Path(".cache")  # Parquet cache of the cleaned frame; delete it to force a re-parse
+REQUIRED_COLS = [
+    "name", "category", "FPro", "Protein", "Total Fat", "Carbohydrate",
+    "Sugars, total", "Fiber, total dietary"
+]
+NUTRIENT_COLS = [
+    "FPro", "Protein", "Total Fat", "Carbohydrate", "Sugars, total", "Fiber, total dietary"
+]
+FPRO_BAND_LABELS = ["0–0.10", "0.10–0.40", "0.40–0.70", "0.70–1.00"]  # en-dash
+FPRO_BAND6_LABELS = [
+    "0-0.125", "0.125-0.25", "0.25-0.375", "0.375-0.50", "0.50-0.675", "0.675-0.75", "0.75-0.875", "0.875-1.00"
+]
+
+def cache_path(csv_path: Path, variant: str, code: Path = Path(__file__)) -> Path:
+    # Keyed by the CSV's mtime+size and the mtime of the cleaning code (this module, or
+    # the calling script), so editing either invalidates the cached frame; one file per variant
+    st, me = csv_path.stat(), code.stat()
+    key = hashlib.sha1(f"{st.st_mtime_ns}:{st.st_size}:{me.st_mtime_ns}".encode()).hexdigest()[:16]
+    return CACHE_DIR / f"{variant}.{key}.parquet"
+
+def write_cache(df: pd.DataFrame, cache: Path):
+    # Drop the variant's stale entries; write via a temp file so an interrupted run
+    # never leaves a truncated Parquet behind under a valid key
+    cache.parent.mkdir(exist_ok=True)
+    for stale in cache.parent.glob(f"{cache.name.split('.')[0]}.*.parquet"):
+        stale.unlink()
+    tmp = cache.with_suffix(".tmp")
+    df.to_parquet(tmp, engine="pyarrow", compression="snappy")
+    tmp.replace(cache)
+
+def load_and_prepare(csv_path: Path, *, with_fpro_band=False, trim_extremes=False) -> pd.DataFrame:
+    # with_fpro_band: add the ordered categorical FPro_band (discrete-color charts)
+    # trim_extremes: also drop Sugar > 90 and Fiber > 49.9 g/100 g
+    if not csv_path.exists():
+        sys.exit(f"ERROR: Could not find {csv_path.name} next to this script.")
+
+    variant = "-".join(["prepared"] + ["band"] * with_fpro_band + ["trim"] * trim_extremes)
+    cache = cache_path(csv_path, variant)
+    if cache.exists():
+        return pd.read_parquet(cache, engine="pyarrow", memory_map=True)
+
+    # Ensure expected columns exist (header only)
+    missing = [c for c in REQUIRED_COLS if c not in pd.read_csv(csv_path, nrows=0).columns]
+    if missing:
+        sys.exit(f"ERROR: Missing required columns: {missing}")
+
+    # Parse only those columns with Arrow's multithreaded reader: nutrients as float32,
+    # category dictionary-encoded (NumPy-backed dtypes, so the np.isnan masks below still apply)
+    df = pd.read_csv(
+        csv_path, usecols=REQUIRED_COLS, engine="pyarrow",
+        dtype={"category": "category", **{c: "float32" for c in NUTRIENT_COLS}},
+    )
+
+    # Standardize column names used for plotting
+    df = df.rename(columns={"Sugars, total": "Sugar", "Fiber, total dietary": "Fiber"})
+
+    # All row filters as one mask over the raw float32 arrays, applied once
+    p, f, c, s, fb, fp = (
+        df[k].to_numpy() for k in ["Protein", "Total Fat", "Carbohydrate", "Sugar", "Fiber", "FPro"]
+    )
+    # Beverage test on the category labels only, then an integer compare over the codes
+    drink_ids = np.where(df["category"].cat.categories.str.lower().str.startswith("drink-"))[0]
+    drink = np.isin(df["category"].cat.codes.to_numpy(), drink_ids)
+    # Missing counts as zero
+    zero_macros = (np.isnan(p) | (p == 0)) & (np.isnan(f) | (f == 0)) & (np.isnan(c) | (c == 0))
+    keep = (
+        # Filter out obvious non-food zero-kcal beverages
+        ~(drink & zero_macros)
+        # Drop rows missing key fields
+        & ~(np.isnan(s) | np.isnan(fb) | np.isnan(p) | np.isnan(f) | np.isnan(c) | np.isnan(fp))
+        # Basic plausibility filters (keep this gentle to avoid over-pruning)
+        & (s >= 0) & (fb >= 0) & (p >= 0) & (f >= 0) & (c >= 0)
+        & (s <= c) & (fb <= c)
+        & (p + f + c <= 110)
+    )
+    if trim_extremes:
+        # Trim extreme sugar/fiber values
+        keep &= (s <= 90) & (fb <= 49.9)
+    df = df[keep]
+    df.eval("macro_sum = Protein + `Total Fat` + Carbohydrate", inplace=True)
+
+    # Calories per 100 g (4/4/9 rule; tooltip only)
+    df.eval("Calories_per_100g = 4*Protein + 4*Carbohydrate + 9*`Total Fat`", inplace=True)
+
+    if with_fpro_band:
+        # Right-closed bands like pd.cut: side="left" keeps an edge value (e.g. 0.10) in the lower band;
+        # outside pd.cut's [-0.001, 1.00] (or NaN) gets code -1 (missing). Edges are float32
+        # like the column, so a CSV value of exactly 0.10 or -0.001 lands as it did in float64
+        fp = df["FPro"].to_numpy(np.float32)
+        codes = np.searchsorted(np.array([0.10, 0.40, 0.70], dtype=np.float32), fp, side="left")
+        codes[~((fp >= -0.001) & (fp <= 1.00))] = -1     # out of range / NaN -> missing
+        df["FPro_band"] = pd.Categorical.from_codes(codes, categories=FPRO_BAND_LABELS, ordered=True)
+
+    # Clean name to strings (category stays categorical)
+    df["name"] = df["name"].astype(str)
+
+    write_cache(df, cache)
+    return df
+
+
+def load_with_polars(csv_path: Path, *, with_fpro_band6=False) -> pd.DataFrame:
+    # The Archive/ variants' loader (needs polars): load_and_prepare's filters without
+    # the extreme-value trim, plus macro_sum and Calories_per_100g
+    # with_fpro_band6: add the ordered categorical FPro_band6 (0.125-wide bands)
+    import polars as pl
+
+    if not csv_path.exists():
+        sys.exit(f"ERROR: Could not find {csv_path.name} next to this script.")
+
+    cache = cache_path(csv_path, "-".join(["polars"] + ["band6"] * with_fpro_band6))
+    if cache.exists():
+        return pd.read_parquet(cache, engine="pyarrow", memory_map=True)
+
+    # One lazy Polars query: the scan, projection and every row filter below are
+    # planned together and executed column-parallel, with no intermediate frames.
+    # category is dictionary-encoded at parse time and arrives in pandas as a categorical.
+    lf = pl.scan_csv(
+        csv_path,
+        schema_overrides={"category": pl.Categorical, **{c: pl.Float32 for c in NUTRIENT_COLS}},
+    )
+    missing = [c for c in REQUIRED_COLS if c not in lf.collect_schema().names()]
+    if missing:
+        sys.exit(f"ERROR: Missing required columns: {missing}")
+
+    macros = ["Protein", "Total Fat", "Carbohydrate"]
+    macro_sum = pl.col("Protein") + pl.col("Total Fat") + pl.col("Carbohydrate")
+    key_fields = ["Sugar", "Fiber", "Protein", "Total Fat", "Carbohydrate", "FPro"]
+
+    # Zero-kcal beverages (e.g., water/unsweetened drinks)
+    zero_kcal_drink = (
+        pl.col("category").cast(pl.String).str.contains(r"(?i)^drink-").fill_null(False)
+        & pl.all_horizontal(pl.col(c).is_null() | (pl.col(c) == 0) for c in macros)
+    )
+    # Beverage + plausibility mask as one expression over raw columns only, so
+    # Polars pushes the whole predicate into the CSV scan and derived columns
+    # are computed for surviving rows only.
+    keep = (
+        ~zero_kcal_drink
+        # Drop rows with missing key fields
+        & pl.all_horizontal(pl.col(c).is_not_null() for c in key_fields)
+        # Gentle plausibility checks
+        & pl.all_horizontal(pl.col(c) >= 0 for c in ["Sugar", "Fiber", *macros])
+        & (pl.col("Sugar") <= pl.col("Carbohydrate"))
+        & (pl.col("Fiber") <= pl.col("Carbohydrate"))
+        & (macro_sum <= 110)
+    )
+
+    df = (
+        lf.select(REQUIRED_COLS)
+          # Standardize names used in the chart
+          .rename({"Sugars, total": "Sugar", "Fiber, total dietary": "Fiber"})
+          .filter(keep)
+          .with_columns(
+              macro_sum=macro_sum,
+              # Calories per 100 g (tooltip only)
+              Calories_per_100g=4*pl.col("Protein") + 4*pl.col("Carbohydrate") + 9*pl.col("Total Fat"),
+          )
+          .collect(engine="streaming")
+          .to_pandas()
+    )
+
+    if with_fpro_band6:
+        # Binary search on the inner edges gives the band codes directly; side="left"
+        # keeps the bands right-closed (an exact edge value falls in the lower band).
+        edges = np.array([0.125, 0.25, 0.375, 0.50, 0.675, 0.75, 0.875], dtype=np.float32)
+        fp = df["FPro"].to_numpy(np.float32)
+        codes = np.searchsorted(edges, fp, side="left").astype(np.int8)
+        codes[~((fp >= -0.001) & (fp <= 1.00))] = -1     # out of range / NaN -> missing
+        df["FPro_band6"] = pd.Categorical.from_codes(codes, categories=FPRO_BAND6_LABELS, ordered=True)
+
+    # Clean name to strings (category stays categorical)
+    df["name"] = df["name"].astype(str)
+
+    write_cache(df, cache)
+    return df
+
+def bin_points(df: pd.DataFrame, bins: int, by=None, *, sqrt=False) -> pd.DataFrame:
+    # Collapse products onto a bins × bins Sugar/Fiber grid (uniform in sqrt space with
+    # sqrt=True, to match sqrt axes): one row per occupied cell (and `by` group) at the
+    # cell centroid, with mean FPro and n = count
+    keys = []
+    for col in ["Sugar", "Fiber"]:
+        v = df[col].to_numpy(np.float32)
+        if sqrt:
+            v = np.sqrt(v)
+        top = float(v.max()) or 1.0
+        keys.append(pd.Series(
+            np.minimum((v / top * bins).astype(np.int32), bins - 1),
+            index=df.index, name=f"_{col}_bin",
+        ))
+    helper_cols = [k.name for k in keys]
+    if by:
+        keys.append(df[by])
+    return (
+        df.groupby(keys, observed=True, sort=False)
+          .agg(Sugar=("Sugar", "mean"), Fiber=("Fiber", "mean"), FPro=("FPro", "mean"), n=("FPro", "size"))
+          .reset_index()
+          .drop(columns=helper_cols)
+    )
+
+def chart_rows(df: pd.DataFrame, bins: int, *, aggregate: bool, band=None, sqrt=False):
+    # The scatter's rows and tooltip, as (rows, tooltip, category_lut).
+    # aggregate: bin_points' grid cells (kept per `band` column if given), category_lut None.
+    # Otherwise one row per product with only the encoded/tooltip fields, since Vega-Lite
+    # serializes every column it is given. category repeats across rows, so rows carry a
+    # small int code and Vega looks the label up in category_lut (see add_category_lookup);
+    # names are ~unique, so they stay inline.
+    import altair as alt
+    band_tip = [alt.Tooltip(f"{band}:N", title="FPro band")] if band else []
+    if aggregate:
+        tooltip = [
+            alt.Tooltip("n:Q", title="Products"),
+            *band_tip,
+            alt.Tooltip("FPro:Q", title="Mean FPro", format=".2f"),
+            alt.Tooltip("Sugar:Q", title="Sugar (g/100 g)", format=".1f"),
+            alt.Tooltip("Fiber:Q", title="Fiber (g/100 g)", format=".1f"),
+        ]
+        return bin_points(df, bins, by=band, sqrt=sqrt), tooltip, None
+
+    category = df["category"].cat.remove_unused_categories()
+    fields = ["name", "FPro", *([band] if band else []), "Sugar", "Fiber", "Calories_per_100g"]
+    rows = df[fields].assign(category_id=category.cat.codes.astype("int16"))
+    category_lut = pd.DataFrame({
+        "category_id": range(len(category.cat.categories)),
+        "category": category.cat.categories.astype(str),
+    })
+    tooltip = [
+        "name:N", "category:N",
+        alt.Tooltip("FPro:Q", title="FPro"),
+        *band_tip,
+        alt.Tooltip("Sugar:Q", title="Sugar (g/100 g)"),
+        alt.Tooltip("Fiber:Q", title="Fiber (g/100 g)"),
+        alt.Tooltip("Calories_per_100g:Q", title="Calories per 100 g"),
+    ]
+    return rows, tooltip, category_lut
+
+def add_category_lookup(chart, category_lut):
+    # Join the category labels onto chart_rows' product rows (no-op for grid cells)
+    if category_lut is None:
+        return chart
+    import altair as alt
+    return chart.transform_lookup(
+        lookup="category_id", from_=alt.LookupData(category_lut, "category_id", ["category"])
+    )
+
+def round_for_chart(df: pd.DataFrame, decimals: int) -> pd.DataFrame:
+    # float32 columns reach the Vega-Lite spec with float64 noise digits
+    # (0.1 -> 0.10000000149011612): widen, then round to `decimals`
+    num = df.select_dtypes("floating").columns
+    return df.astype({c: "float64" for c in num}).round(decimals)
+
+def enable_data_transformer():
+    # Let Altair handle large datasets: VegaFusion if available, else inline all rows
+    import altair as alt
+    if HAVE_VEGAFUSION:
+        alt.data_transformers.enable("vegafusion")
+    else:
+        alt.data_transformers.disable_max_rows()
+
+def chart_data(df: pd.DataFrame, csv_out: str, decimals: int, *, external=False):
+    # Rows inline in the HTML, or (external) in a sibling CSV that the page
+    # loads by URL: keeps the HTML small and leaves parsing to Vega
+    import altair as alt
+    df = round_for_chart(df, decimals)
+    if not external:
+        return df
+    df.to_csv(csv_out, index=False)
+    parse = {c: "number" for c in df.columns if pd.api.types.is_numeric_dtype(df[c])}
+    return alt.Data(url=csv_out, format=alt.DataFormat(type="csv", parse=parse))
+
+def save_chart(chart, html_out: str, static_stem: str, *, export_static=False,
+               external_data=False, canvas=False):
+    # Write the HTML (canvas=True: one bitmap per frame instead of an SVG node per
+    # point, no export menu) and, with export_static, <static_stem>.png/.svg
+    embed_options = {"renderer": "canvas", "actions": False} if canvas else None
+    chart.save(html_out, embed_options=embed_options)
+    print(f"Saved: {html_out}")
+    if external_data:
+        # Browsers refuse to fetch the data CSV from a file:// page, so a double-clicked HTML is empty
+        print("Chart data is loaded from the sibling CSV: run `python -m http.server` here and "
+              f"open http://localhost:8000/{html_out}")
+    else:
+        print("Open this file in your browser to view the chart.")
+
+    # Static exports are slow and optional: chart.save renders PNG/SVG in-process with
+    # vl-convert (pip install vl-convert-python), no Node.js/altair_saver
+    if export_static and external_data:
+        print("Static export needs the rows inline: set EXTERNAL_DATA = False and re-run.")
+    elif export_static:
+        chart.save(f"{static_stem}.png", scale_factor=2)
+        chart.save(f"{static_stem}.svg")
+        print("Also saved PNG and SVG.")
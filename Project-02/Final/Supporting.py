@@ -12,7 +12,8 @@ from pathlib import Path
 # 1) Load data
 # ------------------------------------------------------------
 xlsx_path = Path("../Dataset/GuttmacherInstituteAbortionDataByState.xlsx")
-df = pd.read_excel(xlsx_path, sheet_name="Guttmacher")
+# Parquet cache of the cleaned 3-column frame: rebuilt when the workbook or this script is newer
+cache = Path(".cache") / f"{xlsx_path.stem}.parquet"
 
 # 为了兼容列名中可能存在的不同短横/长横，做个“模糊取名”
 def pick_col(startswith_text):
@@ -21,17 +22,28 @@ def pick_col(startswith_text):
             return c
     raise KeyError(f"Cannot find column starting with: {startswith_text}")
 
-clinics_col = pick_col("% change in the no. of abortion clinics".lower())
-rate_col    = pick_col("% change in abortion rate".lower())
-state_col   = "U.S. State"
+# __file__ is undefined when this runs as a notebook cell: then only the workbook's mtime counts
+script = globals().get("__file__")
+fresh_after = max(xlsx_path.stat().st_mtime, Path(script).stat().st_mtime if script else 0)
+if cache.exists() and cache.stat().st_mtime >= fresh_after:
+    use = pd.read_parquet(cache)
+else:
+    df = pd.read_excel(xlsx_path, sheet_name="Guttmacher", engine="openpyxl")
 
-use = df[[state_col, clinics_col, rate_col]].copy()
-use.columns = ["state", "delta_clinics_pct", "delta_rate_pct"]
+    clinics_col = pick_col("% change in the no. of abortion clinics".lower())
+    rate_col    = pick_col("% change in abortion rate".lower())
+    state_col   = "U.S. State"
 
-# Data cleaning: transform to numeric, drop NaNs
-for c in ["delta_clinics_pct", "delta_rate_pct"]:
-    use[c] = pd.to_numeric(use[c], errors="coerce")
-use = use.dropna(subset=["delta_clinics_pct", "delta_rate_pct"]).copy()
+    use = df[[state_col, clinics_col, rate_col]].copy()
+    use.columns = ["state", "delta_clinics_pct", "delta_rate_pct"]
+
+    # Data cleaning: transform to numeric, drop NaNs
+    for c in ["delta_clinics_pct", "delta_rate_pct"]:
+        use[c] = pd.to_numeric(use[c], errors="coerce")
+    use = use.dropna(subset=["delta_clinics_pct", "delta_rate_pct"]).copy()
+
+    cache.parent.mkdir(exist_ok=True)
+    use.to_parquet(cache, index=False)
 
 # ------------------------------------------------------------
 # 2) Sorting (top: more negative clinics % change)
@@ -45,14 +57,8 @@ use = use.sort_values(
 state_order = use["state"].tolist()
 
 # 额外字段：诊所增减方向（用于配色）
-def dir_label(x):
-    if x < 0:
-        return "Clinics ↓"
-    elif x > 0:
-        return "Clinics ↑"
-    else:
-        return "Clinics ="
-use["clinics_dir"] = use["delta_clinics_pct"].apply(dir_label)
+v = use["delta_clinics_pct"].to_numpy()
+use["clinics_dir"] = np.select([v < 0, v > 0], ["Clinics ↓", "Clinics ↑"], default="Clinics =")
 
 # 供阴影线使用的“行索引”与轻度平滑路径（移动平均）
 use["row_index"] = np.arange(len(use))
@@ -103,26 +109,13 @@ rule = (
     )
 )
 
-# (c) 左端点（诊所%变化）— 方块，且带“端点形状”图例
-left_pts = (
-    base.mark_point(shape="square", filled=True, size=150, stroke="black", strokeWidth=0.2)
-    .encode(
-        x=alt.X("delta_clinics_pct:Q", scale=x_scale),
-        y=alt.Y("state:N", sort=state_order),
-        color=alt.Color("clinics_dir:N", scale=color_scale, legend=None),
-        shape=alt.Shape("endpoint:N",
-                        scale=alt.Scale(domain=["Clinics Δ", "Rate Δ"],
-                                        range=["square", "circle"]),
-                        legend=alt.Legend(title="Endpoints")),
-    )
-    .transform_calculate(endpoint="'Clinics Δ'")
-)
-
-# (d) 右端点（堕胎率%变化）— 三角
-right_pts = (
-    base.mark_point(shape="circle", filled=True, size=150, stroke="black", strokeWidth=0.2)
+# (c) 两端点：fold 成一层 — 方块 = 诊所%变化，圆点 = 堕胎率%变化，带“端点形状”图例
+points = (
+    base.transform_fold(["delta_clinics_pct", "delta_rate_pct"], as_=["k", "x_val"])
+    .transform_calculate(endpoint="datum.k === 'delta_clinics_pct' ? 'Clinics Δ' : 'Rate Δ'")
+    .mark_point(filled=True, size=150, stroke="black", strokeWidth=0.2)
     .encode(
-        x=alt.X("delta_rate_pct:Q", scale=x_scale),
+        x=alt.X("x_val:Q", scale=x_scale),
         y=alt.Y("state:N", sort=state_order),
         color=alt.Color("clinics_dir:N", scale=color_scale, legend=None),
         shape=alt.Shape("endpoint:N",
@@ -130,15 +123,14 @@ right_pts = (
                                         range=["square", "circle"]),
                         legend=alt.Legend(title="Endpoints")),
     )
-    .transform_calculate(endpoint="'Rate Δ'")
 )
 
-# (e) x=0 的参考虚线 — thicker, medium gray, bottom layer
+# (d) x=0 的参考虚线 — thicker, medium gray, bottom layer
 vline0 = alt.Chart(pd.DataFrame({"x": [10]})).mark_rule(
     strokeDash=[4, 4], color="black", strokeWidth=2, opacity=0.3, strokeCap="round"
 ).encode(x=alt.X("x:Q", scale=x_scale))
 
-chart = alt.layer(vline0, shadow, rule, left_pts, right_pts).resolve_scale(color="shared")
+chart = alt.layer(vline0, shadow, rule, points).resolve_scale(color="shared")
 
 # 标题
 chart = chart.properties(